@@ -0,0 +1,292 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AutoGrain  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def micrograph():
+    return AutoGrain.synthetic_micrograph((900, 1100), 25, seed=5)[0]
+
+
+@pytest.mark.parametrize("seed", [3, 4])
+def test_skeletonization_keeps_edge_grains(seed):
+    image = AutoGrain.synthetic_micrograph((1000, 1000), 30, seed=seed)[0]
+    plain = AutoGrain.GrainAnalysisEngine(seed=1).analyze(image, 1.0, overlay=False)
+    thin = AutoGrain.GrainAnalysisEngine(seed=1, skeletonize=True).analyze(image, 1.0, overlay=False)
+    assert thin.grains_intercepted == plain.grains_intercepted
+    assert thin.grains_inside == plain.grains_inside
+
+
+class _CountingReader:
+    """Region reader over an in-memory image that records the largest read."""
+    def __init__(self, image):
+        self.image = image
+        self.shape = image.shape
+        self.largest = 0
+
+    def read_region(self, y0, y1, x0, x1):
+        self.largest = max(self.largest, (y1 - y0) * (x1 - x0))
+        return self.image[y0:y1, x0:x1]
+
+
+def test_intercept_estimate_reads_in_blocks():
+    image = AutoGrain.synthetic_micrograph((4800, 4600), 150, boundary_width=12, blur=6.0, seed=1)[0]
+    reader = _CountingReader(image)
+    engine = AutoGrain.GrainAnalysisEngine(target_intercept_px=20)
+    assert engine.estimate_intercept_px(reader) == engine.estimate_intercept_px(image)
+    assert reader.largest <= 2048 ** 2
+    assert engine.decimation(reader) > 1
+
+
+@pytest.mark.parametrize("options", [{"method": "profile"}, {"band_preprocessing": True}])
+def test_batch_without_tiled_overlay(tmp_path, options):
+    image = AutoGrain.synthetic_micrograph((700, 600), 30, seed=2)[0]
+    path = str(tmp_path / "sample.png")
+    AutoGrain.cv2.imwrite(path, image)
+    row = AutoGrain._analyze_file(path, 1.0, AutoGrain.DEFAULT_MATERIAL, 1, overlay_dir=str(tmp_path),
+                                  tile_size=256, engine_options=options)
+    assert row["status"] == "ok", row["error"]
+
+
+def test_batch_bands_on_tiled_tiff(tmp_path):
+    tifffile = pytest.importorskip("tifffile")
+    image = AutoGrain.synthetic_micrograph((700, 600), 30, seed=2)[0]
+    path = str(tmp_path / "sample.tif")
+    tifffile.imwrite(path, image, tile=(256, 256), compression="zlib")
+    row = AutoGrain._analyze_file(path, 1.0, AutoGrain.DEFAULT_MATERIAL, 1, overlay_dir=str(tmp_path),
+                                  engine_options={"band_preprocessing": True})
+    assert row["status"] == "ok", row["error"]
+    assert row["processed_fraction"] > 0
+
+
+def _contour_intercepts(edges, center, radius):
+    """The original intercept count: external contours of the circle AND the edge map."""
+    mask = np.zeros(edges.shape, np.uint8)
+    AutoGrain.cv2.circle(mask, center, radius, 255, 1)
+    contours, _ = AutoGrain.cv2.findContours(AutoGrain.cv2.bitwise_and(mask, edges), AutoGrain.cv2.RETR_EXTERNAL,
+                                             AutoGrain.cv2.CHAIN_APPROX_SIMPLE)
+    return len(contours)
+
+
+def test_perimeter_runs_match_contour_count():
+    rng = np.random.default_rng(0)
+    geometry = AutoGrain.GeometryCache()
+    for case in range(400):
+        h, w = rng.integers(40, 200, size=2)
+        if case % 2:
+            edges = AutoGrain.GrainAnalysisEngine().preprocess(
+                AutoGrain.synthetic_micrograph((int(h), int(w)), rng.uniform(5, 30), seed=case)[0])
+        else:
+            edges = (rng.random((h, w)) < rng.uniform(0.05, 0.6)).astype(np.uint8) * 255
+        center = (int(rng.integers(0, w)), int(rng.integers(0, h)))
+        radius = int(rng.integers(1, max(h, w)))
+        ys, xs, link, bridge = geometry.circle((int(h), int(w)), radius, center)
+        n, _ = AutoGrain.count_boundary_runs(edges[ys, xs] > 0, link, bridge)
+        assert n == _contour_intercepts(edges, center, radius), (case, center, radius)
+
+
+@pytest.mark.parametrize("shape", [(480, 640), (517, 389), (1000, 1000)])
+def test_tiled_clahe_is_bit_exact(shape):
+    image = AutoGrain.synthetic_micrograph(shape, 20, seed=1)[0]
+    expected = AutoGrain.cv2.createCLAHE(clipLimit=2.5, tileGridSize=(8, 8)).apply(image)
+    clahe = AutoGrain.TiledCLAHE(2.5, (8, 8)).fit(image, shape, block=128)
+    assert np.array_equal(clahe.apply(image, 0, 0), expected)
+    y0, x0 = shape[0] // 3, shape[1] // 4
+    assert np.array_equal(clahe.apply(image[y0:y0 + 150, x0:x0 + 170], y0, x0), expected[y0:y0 + 150, x0:x0 + 170])
+
+
+TILED_CASES = [
+    {"method": "circles", "grain_stats": True},
+    {"method": "circles", "target_precision": 0.05, "skeletonize": True},
+    {"method": "lines", "line_directions": tuple(AutoGrain.LINE_DIRECTIONS)},
+    {"method": "density", "map_window": 200},
+    {"method": "sweep", "directional_angles": 6},
+]
+
+
+@pytest.mark.parametrize("options", TILED_CASES)
+def test_tiled_matches_full_frame(micrograph, options):
+    full = AutoGrain.GrainAnalysisEngine(seed=7, **options).analyze(micrograph, 2.0)
+    tiled = AutoGrain.GrainAnalysisEngine(seed=7, **options).analyze_tiled(micrograph, 2.0, tile_size=384)
+    assert tiled.total_intercepts == full.total_intercepts
+    assert tiled.total_circumference_px == pytest.approx(full.total_circumference_px)
+    assert tiled.circles == full.circles
+    assert tiled.test_fields == pytest.approx(full.test_fields)
+    assert (tiled.grains_inside, tiled.grains_intercepted) == (full.grains_inside, full.grains_intercepted)
+    if full.grains is not None:
+        # Same grains, in tile order rather than raster order
+        order_full = np.lexsort((full.grains["centroid_x"], full.grains["centroid_y"]))
+        order_tiled = np.lexsort((tiled.grains["centroid_x"], tiled.grains["centroid_y"]))
+        for name, column in full.grains.items():
+            assert tiled.grains[name][order_tiled] == pytest.approx(column[order_full]), name
+    if full.window_map is not None:
+        assert np.array_equal(tiled.window_map["crossings"], full.window_map["crossings"])
+    if full.directional is not None:
+        assert np.array_equal(tiled.directional["intercepts"], full.directional["intercepts"])
+    if full.radial is not None:
+        assert np.array_equal(tiled.radial["intercepts"], full.radial["intercepts"])
+
+
+def test_line_grids_come_from_the_geometry_cache(micrograph):
+    geometry = AutoGrain.GeometryCache()
+    engine = AutoGrain.GrainAnalysisEngine(method="lines", line_spacing=3, geometry_cache=geometry)
+    first = engine.analyze(micrograph, 1.0, overlay=False)
+    misses = geometry.stats()["misses"]
+    second = engine.analyze(micrograph, 1.0, overlay=False)
+    assert geometry.stats()["misses"] == misses
+    assert second.directions == first.directions
+    n_lines, kept, lengths = geometry.line_grid(micrograph.shape, "rows", 3)
+    assert (n_lines, len(kept)) == (micrograph.shape[0], first.directions["rows"]["n_lines"])
+
+
+def _tiff_cases():
+    image = AutoGrain.synthetic_micrograph((300, 260), 20, seed=1)[0]
+    rgb = np.dstack([image, (image * 0.7).astype(np.uint8), 255 - image])
+    ramp = np.arange(256)
+    colormap = np.stack([ramp * 200, ramp * 100, (255 - ramp) * 250]).astype(np.uint16)
+    return {
+        "memmap": (image, {}),
+        "striped": (image, {"rowsperstrip": 32, "compression": "zlib"}),
+        "tiled": (image, {"tile": (64, 64), "compression": "zlib"}),
+        "rgb": (rgb, {"photometric": "rgb"}),
+        "rgb_tiled": (rgb, {"photometric": "rgb", "tile": (64, 64), "compression": "zlib"}),
+        "uint16": (image.astype(np.uint16) * 257 + 100, {}),
+        "miniswhite": (image, {"photometric": "miniswhite"}),
+        "palette": (image // 32, {"photometric": "palette", "colormap": colormap}),
+    }
+
+
+@pytest.mark.parametrize("name", list(_tiff_cases()))
+def test_tiff_reader_matches_imread(tmp_path, name):
+    tifffile = pytest.importorskip("tifffile")
+    data, options = _tiff_cases()[name]
+    path = str(tmp_path / f"{name}.tif")
+    tifffile.imwrite(path, data, **options)
+    with AutoGrain.TiffRegionReader(path) as reader:
+        assert (reader._memmap is not None) == ("compression" not in options)
+        expected = AutoGrain.cv2.cvtColor(AutoGrain.cv2.imread(path), AutoGrain.cv2.COLOR_BGR2GRAY)
+        assert np.array_equal(reader.read_region(0, reader.shape[0], 0, reader.shape[1]), expected)
+        assert np.array_equal(reader.read_region(70, 200, 30, 190), expected[70:200, 30:190])
+
+
+def test_unsupported_tiff_falls_back_to_imread(tmp_path):
+    tifffile = pytest.importorskip("tifffile")
+    path = str(tmp_path / "cmyk.tif")
+    tifffile.imwrite(path, np.zeros((64, 64, 4), np.uint8), photometric="separated")
+    assert not isinstance(AutoGrain.open_micrograph(path), AutoGrain.TiffRegionReader)
+
+
+def test_failed_analysis_with_directional_angles(tmp_path):
+    path = str(tmp_path / "blank.png")
+    AutoGrain.cv2.imwrite(path, np.full((300, 400), 128, np.uint8))
+    row = AutoGrain._analyze_file(path, 1.0, AutoGrain.DEFAULT_MATERIAL, 1,
+                                  engine_options={"directional_angles": 6})
+    assert row["status"] == "failed", row["error"]
+    assert row["directional_yield_strength_min"] is None
+
+
+def test_normalized_tiled_run_reads_in_blocks():
+    image = AutoGrain.synthetic_micrograph((3000, 2800), 150, boundary_width=12, blur=6.0, seed=2)[0]
+    reader = _CountingReader(image)
+    full = AutoGrain.GrainAnalysisEngine(seed=3, target_intercept_px=20).analyze(image, 2.0)
+    tiled = AutoGrain.GrainAnalysisEngine(seed=3, target_intercept_px=20).analyze_tiled(reader, 2.0, tile_size=256)
+    assert full.decimation == tiled.decimation > 1
+    assert tiled.circles == full.circles and tiled.pixel_scale == full.pixel_scale
+    assert reader.largest <= 2048 ** 2
+
+
+def test_material_and_scale_changes_hit_the_stage_cache(micrograph):
+    cache = AutoGrain.LRUCache()
+    engine = AutoGrain.GrainAnalysisEngine(seed=1, stage_cache=cache)
+    first = engine.analyze(micrograph, 1.0, "Steel (Low Carbon)")
+    second = engine.analyze(micrograph, 2.5, "Titanium (CP Grade 2)")
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert (second.circles, second.mean_intercept_px) == (first.circles, first.mean_intercept_px)
+    assert second.material == "Titanium (CP Grade 2)" and second.pixel_scale == 2.5
+
+
+def test_pipeline_parameter_change_misses_the_stage_cache(micrograph):
+    cache = AutoGrain.LRUCache()
+    engine = AutoGrain.GrainAnalysisEngine(seed=1, stage_cache=cache)
+    engine.analyze(micrograph, 1.0)
+    engine.canny_low = 30
+    assert engine.params.canny_low == 30
+    engine.analyze(micrograph, 1.0)
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_label_grains_and_jeffries_counts_on_a_grid():
+    # 1 px boundaries every 20 px: 5 x 6 cells, the outer ring cut by the frame
+    boundary = np.zeros((95, 115), np.uint8)
+    boundary[19::20] = 255
+    boundary[:, 19::20] = 255
+    labels, boxes = AutoGrain.label_grains(boundary)
+    assert len(boxes) == labels.max() == 30
+    assert AutoGrain.jeffries_counts(boxes, boundary.shape) == (3 * 4, 30 - 3 * 4)
+    # A 1 px sliver column along the right edge is not a grain: the cells beside it
+    # no longer touch the frame and count as inside
+    boundary[:, 113] = 255
+    _, boxes = AutoGrain.label_grains(boundary)
+    assert len(boxes) == 35
+    assert AutoGrain.jeffries_counts(boxes, boundary.shape, min_area=25) == (3 * 5, 30 - 3 * 5)
+
+
+@pytest.mark.parametrize("seed, mean_intercept", [(0, 25), (1, 40)])
+def test_planimetric_count_matches_synthetic_truth(seed, mean_intercept):
+    image, truth = AutoGrain.synthetic_micrograph((900, 1100), mean_intercept, seed=seed)
+    result = AutoGrain.GrainAnalysisEngine(seed=1).analyze(image, 2.0, overlay=False)
+    # Every rendered cell meeting the frame is either inside or cut by the frame edge
+    assert result.grains_inside + result.grains_intercepted == pytest.approx(truth["n_grains"], rel=0.03)
+    assert 0 < result.grains_intercepted < result.grains_inside
+    n_a = (result.grains_inside + 0.5 * result.grains_intercepted + 1) / (900 * 1100) * 2000.0 ** 2
+    assert result.frame_area_px == 900 * 1100
+    assert result.grains_per_mm2 == pytest.approx(n_a)
+    assert result.astm_g_planimetric == pytest.approx(3.321928 * np.log10(n_a) - 2.954)
+
+
+UNCERTAINTY_FIELDS = [(40 + i % 7, 1200.0 + 15 * i) for i in range(16)]
+
+
+def test_uncertainty_intervals_bracket_the_mean():
+    summary = AutoGrain.propagate_uncertainty(UNCERTAINTY_FIELDS, 2.0, 70.0, 23.0, n_samples=20_000,
+                                              rng=np.random.default_rng(0))
+    counts, lengths = zip(*UNCERTAINTY_FIELDS)
+    d_mm = sum(lengths) / sum(counts) / 2.0 / 1000.0
+    for name, stats in summary.items():
+        assert stats["lo"] <= stats["mean"] <= stats["hi"], name
+        assert stats["sd"] > 0, name
+    assert summary["d_mm"]["lo"] < d_mm < summary["d_mm"]["hi"]
+
+
+def test_uncertainty_is_reproducible_with_a_seeded_rng():
+    first, second, other = (AutoGrain.propagate_uncertainty(UNCERTAINTY_FIELDS, 2.0, 70.0, 23.0, n_samples=5000,
+                                                            rng=np.random.default_rng(seed)) for seed in (3, 3, 4))
+    assert first == second
+    assert first != other
+
+
+def test_uncertainty_without_intercepts_is_nan():
+    summary = AutoGrain.propagate_uncertainty([(0, 1000.0)] * 4, 2.0, 70.0, 23.0, n_samples=1000,
+                                              rng=np.random.default_rng(0))
+    for stats in summary.values():
+        assert stats["mean"] is None and stats["sd"] is None
+        assert np.isnan(stats["lo"]) and np.isnan(stats["hi"])
+    # Resamples that drew only empty fields are dropped, the rest still give an interval
+    summary = AutoGrain.propagate_uncertainty([(0, 1000.0)] + UNCERTAINTY_FIELDS[:3], 2.0, 70.0, 23.0,
+                                              n_samples=1000, rng=np.random.default_rng(0))
+    assert all(np.isfinite([stats["mean"], stats["lo"], stats["hi"]]).all() for stats in summary.values())
+
+
+def test_uncertainty_runtime_for_100k_samples():
+    fields = UNCERTAINTY_FIELDS * 4
+    AutoGrain.propagate_uncertainty(fields, 2.0, 70.0, 23.0, n_samples=1000)
+    start = time.perf_counter()
+    AutoGrain.propagate_uncertainty(fields, 2.0, 70.0, 23.0, n_samples=100_000, rng=np.random.default_rng(0))
+    assert time.perf_counter() - start < 1.0